@@ -1,5 +1,7 @@
 """Consolidate duplicate commission rows for the portfolio reconciliation demo."""
 
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 
 import pandas as pd
@@ -8,6 +10,9 @@ import pandas as pd
 DATA_DIR = Path("data")
 INPUT_FILE = DATA_DIR / "commission_exports.xlsx"
 OUTPUT_FILE = DATA_DIR / "commission_exports_grouped.xlsx"
+OUTPUT_PARQUET = DATA_DIR / "commission_exports_grouped.parquet"
+EXCEL_READER = "calamine" if find_spec("python_calamine") else None
+EXPORT_XLSX = "--xlsx" in sys.argv[1:]
 
 PROVIDER_COL = "Provider"
 LOCATOR_COL = "BookingLocator"
@@ -20,30 +25,31 @@ def require_columns(df: pd.DataFrame, sheet_label: str) -> None:
         raise ValueError(f"{sheet_label} is missing required columns: {missing}")
 
 
-df = pd.read_excel(INPUT_FILE)
+df = pd.read_excel(INPUT_FILE, engine=EXCEL_READER)
 df.columns = df.columns.str.strip()
 require_columns(df, "Commission export")
 
 df[VALUE_COL] = pd.to_numeric(df[VALUE_COL], errors="coerce").fillna(0)
 
-grouped = (
-    df.groupby([PROVIDER_COL, LOCATOR_COL], as_index=False)[VALUE_COL]
-    .sum()
-    .sort_values([PROVIDER_COL, LOCATOR_COL])
-)
+grouped = df.groupby([PROVIDER_COL, LOCATOR_COL], as_index=False, sort=True)[VALUE_COL].sum()
 
-grouped.to_excel(OUTPUT_FILE, index=False)
-print(f"✅ Grouped commission export saved to {OUTPUT_FILE}")
+grouped.astype({col: "string" for col in grouped.select_dtypes("object").columns}).to_parquet(
+    OUTPUT_PARQUET, engine="pyarrow", compression="zstd", index=False
+)
+print(f"✅ Grouped commission export saved to {OUTPUT_PARQUET}")
+if EXPORT_XLSX:
+    grouped.to_excel(OUTPUT_FILE, index=False)
+    print(f"   Excel copy saved to {OUTPUT_FILE}")
 
 # --- validation snapshot ----------------------------------------------------
 orig_totals = (
-    df.groupby(LOCATOR_COL, as_index=False)[VALUE_COL]
+    df.groupby(LOCATOR_COL, as_index=False, sort=False)[VALUE_COL]
     .sum()
     .rename(columns={VALUE_COL: "OriginalValue"})
 )
 
 grouped_totals = (
-    grouped.groupby(LOCATOR_COL, as_index=False)[VALUE_COL]
+    grouped.groupby(LOCATOR_COL, as_index=False, sort=False)[VALUE_COL]
     .sum()
     .rename(columns={VALUE_COL: "GroupedValue"})
 )
@@ -2,11 +2,11 @@
 
 from __future__ import annotations
 
-import re
+import csv
+import sys
 from pathlib import Path
 from typing import Iterable
 
-import numpy as np
 import pandas as pd
 from importlib.util import find_spec
 
@@ -14,6 +14,8 @@ from importlib.util import find_spec
 DATA_DIR = Path("data")
 INPUT_CSV = DATA_DIR / "commission_snapshot.csv"
 OUTPUT_XLSX = DATA_DIR / "commission_snapshot_agg.xlsx"
+OUTPUT_PARQUET = DATA_DIR / "commission_snapshot_agg.parquet"
+EXPORT_XLSX = "--xlsx" in sys.argv[1:]
 
 LOCATOR_COL = "BookingLocator"
 AMOUNT_COL = "GrossAmountUSD"
@@ -22,46 +24,46 @@ CURRENCY_COL = "Currency"
 SALE_DATE_COL = "SaleDate"
 SERVICE_DATE_COL = "ServiceDate"
 
+AMOUNT_NOISE = r"[\$, ]"
+EXCEL_SERIAL = r"[+-]?\d+(\.\d+)?"
+
+
+def sniff_delimiter(path: Path, encoding: str) -> str:
+    with path.open("r", encoding=encoding, newline="") as fp:
+        head = fp.read(8192)
+    return csv.Sniffer().sniff(head, delimiters=",;\t|").delimiter
+
 
 def read_csv_safely(path: Path) -> pd.DataFrame:
     for encoding in ("utf-8-sig", "utf-8", "latin-1", "cp1252"):
         try:
-            return pd.read_csv(path, sep=None, engine="python", encoding=encoding)
+            delimiter = sniff_delimiter(path, encoding)
+            return pd.read_csv(path, sep=delimiter, encoding=encoding, engine="pyarrow", dtype_backend="pyarrow")
         except Exception:
             continue
     return pd.read_csv(path, sep=None, engine="python")
 
 
-def to_number(value: object) -> float:
-    if pd.isna(value):
-        return np.nan
-    text = str(value).strip()
-    if not text:
-        return np.nan
-    is_negative = text.startswith("(") and text.endswith(")")
-    if is_negative:
-        text = text[1:-1]
-    sanitized = text.replace("$", "").replace(",", "").replace(" ", "")
-    try:
-        result = float(sanitized)
-    except ValueError:
-        result = pd.to_numeric(sanitized, errors="coerce")
-    if pd.isna(result):
-        return np.nan
-    return -result if is_negative else result
-
-
-def excelish_datetime(value: object) -> pd.Timestamp | pd.NaT:
-    if pd.isna(value):
-        return pd.NaT
-    if isinstance(value, (pd.Timestamp, np.datetime64)):
-        return pd.to_datetime(value, errors="coerce")
-    text = str(value).strip()
-    if not text:
-        return pd.NaT
-    if re.fullmatch(r"[+-]?\d+(\.\d+)?", text):
-        return pd.to_datetime(float(text), unit="d", origin="1899-12-30", errors="coerce")
-    return pd.to_datetime(text, errors="coerce")
+def to_number(series: pd.Series) -> pd.Series:
+    text = series.astype("string[pyarrow]").str.strip()
+    is_negative = (text.str.startswith("(") & text.str.endswith(")")).fillna(False)
+    text = text.where(~is_negative, text.str.slice(1, -1))
+    sanitized = text.str.replace(AMOUNT_NOISE, "", regex=True)
+    values = pd.to_numeric(sanitized, errors="coerce").astype("float64")
+    return values.where(~is_negative, -values)
+
+
+def excelish_datetime(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    text = series.astype("string[pyarrow]").str.strip()
+    is_serial = text.str.fullmatch(EXCEL_SERIAL).fillna(False)
+    result = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    result[is_serial] = pd.to_datetime(
+        text[is_serial].astype("float64"), unit="D", origin="1899-12-30", errors="coerce"
+    )
+    result[~is_serial] = pd.to_datetime(text[~is_serial], format="mixed", errors="coerce")
+    return result
 
 
 def ensure_columns(df: pd.DataFrame, columns: Iterable[str]) -> None:
@@ -71,37 +73,53 @@ def ensure_columns(df: pd.DataFrame, columns: Iterable[str]) -> None:
 
 
 df = read_csv_safely(INPUT_CSV)
-df = df.loc[:, ~df.columns.str.contains(r"^Unnamed:", case=False)]
+# A trailing delimiter yields "Unnamed: N" under the python engine and "" under pyarrow.
+df = df.loc[:, ~(df.columns.str.contains(r"^Unnamed:", case=False) | (df.columns == ""))]
 ensure_columns(df, [LOCATOR_COL, AMOUNT_COL, COMMISSION_COL, CURRENCY_COL, SALE_DATE_COL, SERVICE_DATE_COL])
 
-df["loc_norm"] = df[LOCATOR_COL].astype(str).str.strip()
-df.loc[df["loc_norm"].isin(["", "nan"]), "loc_norm"] = np.nan
+loc_norm = df[LOCATOR_COL].astype("string[pyarrow]").str.strip()
+df["loc_norm"] = loc_norm.mask(loc_norm.eq("") | loc_norm.eq("nan"))
 
-df["GrossAmountValue"] = df[AMOUNT_COL].apply(to_number)
-df["CommissionValue"] = df[COMMISSION_COL].apply(to_number)
-df["SaleDate"] = df[SALE_DATE_COL].apply(excelish_datetime)
-df["ServiceDate"] = df[SERVICE_DATE_COL].apply(excelish_datetime)
+df["GrossAmountValue"] = to_number(df[AMOUNT_COL])
+df["CommissionValue"] = to_number(df[COMMISSION_COL])
+df["SaleDate"] = excelish_datetime(df[SALE_DATE_COL])
+df["ServiceDate"] = excelish_datetime(df[SERVICE_DATE_COL])
+
+located = df.dropna(subset=["loc_norm"])
+
+# Dominant currency per locator (ties go to the first code alphabetically, like Series.mode).
+currency = (
+    located.groupby(["loc_norm", CURRENCY_COL])
+    .size()
+    .reset_index(name="n")
+    .sort_values(["loc_norm", "n", CURRENCY_COL], ascending=[True, False, True])
+    .drop_duplicates("loc_norm")
+    .loc[:, ["loc_norm", CURRENCY_COL]]
+)
 
 aggregated = (
-    df.dropna(subset=["loc_norm"])
-    .groupby("loc_norm", as_index=False)
+    located.groupby("loc_norm", as_index=False)
     .agg(
         CommissionWithoutTaxUSD=("CommissionValue", "sum"),
         GrossAmountUSD=("GrossAmountValue", "sum"),
         Rows=("loc_norm", "size"),
-        Currency=(CURRENCY_COL, lambda s: s.mode().iloc[0] if not s.mode().empty else np.nan),
         SaleDateMin=("SaleDate", "min"),
         SaleDateMax=("SaleDate", "max"),
     )
+    .merge(currency, on="loc_norm", how="left")
+    .loc[:, ["loc_norm", "CommissionWithoutTaxUSD", "GrossAmountUSD", "Rows", CURRENCY_COL, "SaleDateMin", "SaleDateMax"]]
 )
 
-engine = "openpyxl" if find_spec("openpyxl") else ("xlsxwriter" if find_spec("xlsxwriter") else None)
-if not engine:
-    raise RuntimeError("Install 'openpyxl' or 'xlsxwriter' to export Excel files.")
-
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-with pd.ExcelWriter(OUTPUT_XLSX, engine=engine, datetime_format="yyyy-mm-dd" if engine == "xlsxwriter" else None) as writer:
-    aggregated.to_excel(writer, sheet_name="booking_locator_agg", index=False)
+aggregated.to_parquet(OUTPUT_PARQUET, engine="pyarrow", compression="zstd", index=False)
+print(f"✅ Aggregated commission snapshot written to {OUTPUT_PARQUET}")
+
+if EXPORT_XLSX:
+    engine = "openpyxl" if find_spec("openpyxl") else ("xlsxwriter" if find_spec("xlsxwriter") else None)
+    if not engine:
+        raise RuntimeError("Install 'openpyxl' or 'xlsxwriter' to export Excel files.")
+    with pd.ExcelWriter(OUTPUT_XLSX, engine=engine, datetime_format="yyyy-mm-dd" if engine == "xlsxwriter" else None) as writer:
+        aggregated.to_excel(writer, sheet_name="booking_locator_agg", index=False)
+    print(f"   Excel copy written to {OUTPUT_XLSX}")
 
-print(f"✅ Aggregated commission snapshot written to {OUTPUT_XLSX}")
 print(f"   Unique locators: {len(aggregated):,}")
@@ -2,13 +2,23 @@
 
 from __future__ import annotations
 
+import functools
 import json
+from importlib.util import find_spec
 from pathlib import Path
 from typing import Any
 
+import numpy as np
 import pandas as pd
 
 
+EXCEL_READER = "calamine" if find_spec("python_calamine") else None
+CATEGORIES = ["Perfect Match", "Commission Gap", "Orders Missing Commission", "Commission Missing Order"]
+NUMBA_MIN_ROWS = 10_000_000
+NUMBA_MAX_GROUPS = 5_000
+LARGE_SHEET_THRESHOLD = 200_000
+
+
 def cfg(config: dict[str, Any], *keys: str) -> Any:
     for key in keys:
         if key in config:
@@ -18,10 +28,11 @@ def cfg(config: dict[str, Any], *keys: str) -> Any:
 
 def normalize_key(series: pd.Series) -> pd.Series:
     return (
-        series.astype(str)
+        series.astype("string[pyarrow]")
         .str.strip()
         .str.replace(r"[^0-9A-Za-z]", "", regex=True)
         .str.upper()
+        .fillna("NAN")  # same key str(nan) normalises to, so blank keys still pair up
     )
 
 
@@ -34,11 +45,27 @@ def load_provider_map() -> dict[str, str]:
     return {}
 
 
-def safe_sum(series: pd.Series | list | None) -> float:
-    if series is None:
-        return 0.0
-    series = pd.to_numeric(pd.Series(series), errors="coerce")
-    return float(series.sum(skipna=True))
+def read_table(path: str | Path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix.lower() == ".parquet":
+        return pd.read_parquet(path, engine="pyarrow", dtype_backend="pyarrow")
+    return pd.read_excel(path, engine=EXCEL_READER)
+
+
+def load_inputs(config: dict[str, Any]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    if "orders_file" in config and "commissions_file" in config:
+        return read_table(config["orders_file"]), read_table(config["commissions_file"])
+
+    workbook = pd.ExcelFile(cfg(config, "input_file"), engine=EXCEL_READER)
+    sheets = {name.lower(): name for name in workbook.sheet_names}
+
+    orders_sheet = cfg(config, "orders_sheet", "odv_sheet").lower()
+    commissions_sheet = cfg(config, "commissions_sheet", "com_sheet").lower()
+    if orders_sheet not in sheets or commissions_sheet not in sheets:
+        raise ValueError(f"Available sheets: {workbook.sheet_names}")
+
+    frames = workbook.parse(sheet_name=[sheets[orders_sheet], sheets[commissions_sheet]])
+    return frames[sheets[orders_sheet]], frames[sheets[commissions_sheet]]
 
 
 def ensure_provider_column(df: pd.DataFrame, candidates: list[str], suffix: str) -> None:
@@ -50,38 +77,121 @@ def ensure_provider_column(df: pd.DataFrame, candidates: list[str], suffix: str)
     df[f"provider_{suffix}"] = pd.NA
 
 
-def breakdown_by_provider(df: pd.DataFrame, category: str) -> pd.DataFrame:
-    if df.empty:
-        return pd.DataFrame()
-    grouped = (
-        df.groupby("Provider", dropna=False)
-        .agg(
-            Records=("key", "count"),
-            ExpectedCommissionUSD=("ExpectedCommissionUSD", "sum"),
-            BilledCommissionUSD=("BilledCommissionUSD", "sum"),
-            CommissionGapUSD=("CommissionGapUSD", "sum"),
+@functools.cache
+def numba_group_sum():
+    # numba is imported (and the kernel compiled or loaded from cache) only
+    # for inputs large enough to repay it.
+    from numba import get_num_threads, njit, prange
+
+    @njit(parallel=True, cache=True)
+    def kernel(codes, expected, billed, gap, n_groups, n_chunks):
+        # Each chunk fills its own row of partial sums, so no two threads
+        # ever write to the same slot.
+        chunk_size = (len(codes) + n_chunks - 1) // n_chunks
+        counts = np.zeros((n_chunks, n_groups), dtype=np.int64)
+        sums = np.zeros((n_chunks, 3, n_groups), dtype=np.float64)
+        for chunk in prange(n_chunks):
+            for i in range(chunk * chunk_size, min((chunk + 1) * chunk_size, len(codes))):
+                group = codes[i]
+                counts[chunk, group] += 1
+                if not np.isnan(expected[i]):
+                    sums[chunk, 0, group] += expected[i]
+                if not np.isnan(billed[i]):
+                    sums[chunk, 1, group] += billed[i]
+                if not np.isnan(gap[i]):
+                    sums[chunk, 2, group] += gap[i]
+        return counts.sum(axis=0), sums.sum(axis=0)
+
+    def group_sum(codes, expected, billed, gap, n_groups):
+        return kernel(codes, expected, billed, gap, n_groups, get_num_threads())
+
+    return group_sum
+
+
+def provider_totals(merged: pd.DataFrame) -> pd.DataFrame:
+    category_codes = merged["Category"].cat.codes.to_numpy(dtype=np.int64)
+    provider_codes = merged["Provider"].cat.codes.to_numpy(dtype=np.int64)
+    n_providers = len(merged["Provider"].cat.categories)
+    n_groups = len(CATEGORIES) * n_providers
+
+    use_numba = (
+        len(merged) >= NUMBA_MIN_ROWS
+        and n_groups <= NUMBA_MAX_GROUPS
+        and find_spec("numba") is not None
+        and not (provider_codes < 0).any()
+    )
+    if not use_numba:
+        return (
+            merged.groupby(["Category", "Provider"], observed=True, dropna=False)
+            .agg(
+                Records=("key", "count"),
+                ExpectedCommissionUSD=("ExpectedCommissionUSD", "sum"),
+                BilledCommissionUSD=("BilledCommissionUSD", "sum"),
+                CommissionGapUSD=("CommissionGapUSD", "sum"),
+            )
+            .reset_index()
         )
-        .reset_index()
-        .fillna({"Provider": "Unassigned"})
+
+    counts, sums = numba_group_sum()(
+        category_codes * n_providers + provider_codes,
+        merged["ExpectedCommissionUSD"].to_numpy(dtype=np.float64),
+        merged["BilledCommissionUSD"].to_numpy(dtype=np.float64),
+        merged["CommissionGapUSD"].to_numpy(dtype=np.float64),
+        n_groups,
     )
-    grouped.insert(0, "Category", category)
+    groups = np.flatnonzero(counts)
+    return pd.DataFrame(
+        {
+            "Category": pd.Categorical.from_codes(groups // n_providers, dtype=merged["Category"].dtype),
+            "Provider": pd.Categorical.from_codes(groups % n_providers, dtype=merged["Provider"].dtype),
+            "Records": counts[groups],
+            "ExpectedCommissionUSD": sums[0, groups],
+            "BilledCommissionUSD": sums[1, groups],
+            "CommissionGapUSD": sums[2, groups],
+        }
+    )
+
+
+def breakdown_by_provider(merged: pd.DataFrame) -> pd.DataFrame:
+    grouped = provider_totals(merged)
+    # "Perfect Match" reports every matched record, so fold the gap rows back in.
+    gap_rows = grouped[grouped["Category"] == "Commission Gap"].assign(Category="Perfect Match")
+    if not gap_rows.empty:
+        grouped = (
+            pd.concat([grouped, gap_rows], ignore_index=True)
+            .astype({"Category": merged["Category"].dtype})
+            .groupby(["Category", "Provider"], observed=True, dropna=False)
+            .sum()
+            .reset_index()
+        )
     return grouped
 
 
+def write_detail_sheet(
+    writer: pd.ExcelWriter,
+    df: pd.DataFrame,
+    sheet_name: str,
+    output_path: Path,
+    threshold: int,
+) -> Path | None:
+    if len(df) <= threshold:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+        return None
+    sidecar = output_path.with_suffix(f".{sheet_name}.parquet")
+    df.astype({col: "string" for col in df.select_dtypes("object").columns}).to_parquet(
+        sidecar, engine="pyarrow", compression="zstd", index=False
+    )
+    pd.DataFrame({"Records": [len(df)], "ParquetFile": [sidecar.name]}).to_excel(
+        writer, sheet_name=sheet_name, index=False
+    )
+    return sidecar
+
+
 def main(config_path: str) -> None:
     with open(config_path, "r", encoding="utf-8") as fp:
         config = json.load(fp)
 
-    workbook = pd.ExcelFile(cfg(config, "input_file"))
-    sheets = {name.lower(): name for name in workbook.sheet_names}
-
-    orders_sheet = cfg(config, "orders_sheet", "odv_sheet").lower()
-    commissions_sheet = cfg(config, "commissions_sheet", "com_sheet").lower()
-    if orders_sheet not in sheets or commissions_sheet not in sheets:
-        raise ValueError(f"Available sheets: {workbook.sheet_names}")
-
-    orders_df = workbook.parse(sheets[orders_sheet])
-    commissions_df = workbook.parse(sheets[commissions_sheet])
+    orders_df, commissions_df = load_inputs(config)
 
     orders_df.columns = orders_df.columns.str.strip().str.lower()
     commissions_df.columns = commissions_df.columns.str.strip().str.lower()
@@ -105,17 +215,22 @@ def main(config_path: str) -> None:
     ensure_provider_column(orders_df, provider_cols, "orders")
     ensure_provider_column(commissions_df, provider_cols, "commissions")
 
-    orders_df["provider_orders"] = orders_df["provider_orders"].replace(provider_map)
-    commissions_df["provider_commissions"] = commissions_df["provider_commissions"].replace(provider_map)
+    orders_df["provider_orders"] = orders_df["provider_orders"].map(provider_map).fillna(orders_df["provider_orders"])
+    commissions_df["provider_commissions"] = (
+        commissions_df["provider_commissions"].map(provider_map).fillna(commissions_df["provider_commissions"])
+    )
 
     orders_df["key"] = normalize_key(orders_df[orders_key])
     commissions_df["key"] = normalize_key(commissions_df[commissions_key])
 
-    orders_df["ExpectedCommissionUSD"] = pd.to_numeric(orders_df[orders_commission], errors="coerce").fillna(0)
-    commissions_df["BilledCommissionUSD"] = pd.to_numeric(
-        commissions_df[commissions_commission],
-        errors="coerce",
-    ).fillna(0)
+    # Amounts go back to NumPy float64: coercing an Arrow string column leaves NaN
+    # (not nulls) that fillna would skip, and np.select/numba want NumPy arrays.
+    orders_df["ExpectedCommissionUSD"] = (
+        pd.to_numeric(orders_df[orders_commission], errors="coerce").astype("float64").fillna(0)
+    )
+    commissions_df["BilledCommissionUSD"] = (
+        pd.to_numeric(commissions_df[commissions_commission], errors="coerce").astype("float64").fillna(0)
+    )
 
     merged = orders_df.merge(
         commissions_df,
@@ -132,66 +247,57 @@ def main(config_path: str) -> None:
         merged.get("provider_orders")
         .combine_first(merged.get("provider_commissions"))
         .fillna("Unassigned")
+        .astype("category")
     )
 
     tolerance = float(config.get("tolerance", 0.25))
-    matches = merged[merged["_merge"] == "both"].copy()
-    orders_only = merged[merged["_merge"] == "left_only"].copy()
-    commissions_only = merged[merged["_merge"] == "right_only"].copy()
-    gaps = matches[matches["CommissionGapUSD"].abs() > tolerance].copy()
-
-    summary = pd.DataFrame(
-        {
-            "Category": [
-                "Perfect Match",
-                "Commission Gap",
-                "Orders Missing Commission",
-                "Commission Missing Order",
-            ],
-            "Records": [len(matches), len(gaps), len(orders_only), len(commissions_only)],
-            "ExpectedCommissionUSD": [
-                safe_sum(matches["ExpectedCommissionUSD"]),
-                safe_sum(gaps["ExpectedCommissionUSD"]),
-                safe_sum(orders_only["ExpectedCommissionUSD"]),
-                0,
-            ],
-            "BilledCommissionUSD": [
-                safe_sum(matches["BilledCommissionUSD"]),
-                safe_sum(gaps["BilledCommissionUSD"]),
-                0,
-                safe_sum(commissions_only["BilledCommissionUSD"]),
-            ],
-            "CommissionGapUSD": [
-                safe_sum(matches["CommissionGapUSD"]),
-                safe_sum(gaps["CommissionGapUSD"]),
-                safe_sum(orders_only["CommissionGapUSD"]),
-                safe_sum(commissions_only["CommissionGapUSD"]),
-            ],
-        }
+    is_match = merged["_merge"].eq("both")
+    is_gap = is_match & merged["CommissionGapUSD"].abs().gt(tolerance)
+    is_orders_only = merged["_merge"].eq("left_only")
+    is_commissions_only = merged["_merge"].eq("right_only")
+    merged["Category"] = pd.Categorical(
+        np.select([is_gap, is_orders_only, is_commissions_only], CATEGORIES[1:], default=CATEGORIES[0]),
+        categories=CATEGORIES,
     )
 
-    provider_summary = pd.concat(
-        [
-            breakdown_by_provider(matches, "Perfect Match"),
-            breakdown_by_provider(gaps, "Commission Gap"),
-            breakdown_by_provider(orders_only, "Orders Missing Commission"),
-            breakdown_by_provider(commissions_only, "Commission Missing Order"),
-        ],
-        ignore_index=True,
+    provider_summary = breakdown_by_provider(merged)
+    summary = (
+        provider_summary.groupby("Category", observed=False)[
+            ["Records", "ExpectedCommissionUSD", "BilledCommissionUSD", "CommissionGapUSD"]
+        ]
+        .sum()
+        .reset_index()
     )
 
+    details = merged.drop(columns="Category")
+    matches = details[is_match]
+    gaps = details[is_gap]
+    orders_only = details[is_orders_only]
+    commissions_only = details[is_commissions_only]
+
     output_path = Path(cfg(config, "output_file"))
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        matches.to_excel(writer, sheet_name="matches", index=False)
-        gaps.to_excel(writer, sheet_name="commission_gap", index=False)
-        orders_only.to_excel(writer, sheet_name="orders_missing_commission", index=False)
-        commissions_only.to_excel(writer, sheet_name="commissions_missing_orders", index=False)
+    # xlsxwriter serialises far faster than openpyxl. Its constant_memory mode is
+    # left off: to_excel writes column by column, which that mode silently drops.
+    engine = "xlsxwriter" if find_spec("xlsxwriter") else "openpyxl"
+    threshold = int(config.get("large_sheet_threshold", LARGE_SHEET_THRESHOLD))
+    with pd.ExcelWriter(output_path, engine=engine) as writer:
+        sidecars = [
+            write_detail_sheet(writer, df, sheet_name, output_path, threshold)
+            for df, sheet_name in (
+                (matches, "matches"),
+                (gaps, "commission_gap"),
+                (orders_only, "orders_missing_commission"),
+                (commissions_only, "commissions_missing_orders"),
+            )
+        ]
         summary.to_excel(writer, sheet_name="summary", index=False)
         provider_summary.to_excel(writer, sheet_name="provider_summary", index=False)
 
     print("=== Portfolio Reconciliation (v3) ===")
     print(summary.to_string(index=False))
     print(f"\nWorkbook saved to: {output_path}")
+    for sidecar in filter(None, sidecars):
+        print(f"Detail rows over {threshold:,} saved to: {sidecar}")
 
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-import re
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 
 import pandas as pd
@@ -11,29 +12,35 @@ import pandas as pd
 DATA_DIR = Path("data")
 INPUT_FILE = DATA_DIR / "sales_orders.xlsx"
 OUTPUT_FILE = DATA_DIR / "sales_orders_clean.xlsx"
+OUTPUT_PARQUET = DATA_DIR / "sales_orders_clean.parquet"
+EXCEL_READER = "calamine" if find_spec("python_calamine") else None
+EXPORT_XLSX = "--xlsx" in sys.argv[1:]
 CONFIRMATION_COL = "OrderLineOrConfirmation"
 
+# Kept as plain strings: compiled re.Pattern objects push pandas off the Arrow kernels.
+TRAILING_DASHES = r"[-]+$"
+DISALLOWED_CHARS = r"[^A-Za-z0-9\-]"
+WHITESPACE_RUNS = r"\s+"
+ALLOWED_CONFIRMATION = r"[A-Za-z0-9\-]+"
 
-def clean_confirmation(value: object) -> str | None:
-    if pd.isna(value):
-        return None
-    text = str(value).strip()
-    text = text.replace(",", " ")
-    text = re.sub(r"[-]+$", "", text)
-    text = re.sub(r"[^A-Za-z0-9\-]", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text or None
 
+def clean_confirmation(series: pd.Series) -> pd.Series:
+    text = series.astype("string[pyarrow]").str.strip()
+    text = text.str.replace(",", " ", regex=False)
+    text = text.str.replace(TRAILING_DASHES, "", regex=True)
+    text = text.str.replace(DISALLOWED_CHARS, "", regex=True)
+    text = text.str.replace(WHITESPACE_RUNS, " ", regex=True).str.strip()
+    return text.mask(text.eq(""))
 
-orders_df = pd.read_excel(INPUT_FILE, sheet_name=0)
+
+orders_df = pd.read_excel(INPUT_FILE, sheet_name=0, engine=EXCEL_READER)
 if CONFIRMATION_COL not in orders_df.columns:
     raise ValueError(f"Column '{CONFIRMATION_COL}' not found. Available: {list(orders_df.columns)}")
 
-orders_df[CONFIRMATION_COL] = orders_df[CONFIRMATION_COL].apply(clean_confirmation)
+orders_df[CONFIRMATION_COL] = clean_confirmation(orders_df[CONFIRMATION_COL])
 orders_df = orders_df[orders_df[CONFIRMATION_COL].notna()].reset_index(drop=True)
 
-allowed_pattern = re.compile(r"^[A-Za-z0-9\-]+$")
-invalid_rows = orders_df[~orders_df[CONFIRMATION_COL].apply(lambda x: bool(allowed_pattern.match(str(x))))]
+invalid_rows = orders_df[~orders_df[CONFIRMATION_COL].str.fullmatch(ALLOWED_CONFIRMATION, na=False)]
 
 if not invalid_rows.empty:
     print("⚠️ Confirmations with unexpected characters detected:")
@@ -43,5 +50,10 @@ else:
     print("✅ All confirmation numbers contain only letters, digits, or hyphens.")
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-orders_df.to_excel(OUTPUT_FILE, index=False)
-print(f"\nClean file saved to: {OUTPUT_FILE}")
+orders_df.astype({col: "string" for col in orders_df.select_dtypes("object").columns}).to_parquet(
+    OUTPUT_PARQUET, engine="pyarrow", compression="zstd", index=False
+)
+print(f"\nClean file saved to: {OUTPUT_PARQUET}")
+if EXPORT_XLSX:
+    orders_df.to_excel(OUTPUT_FILE, index=False)
+    print(f"Excel copy saved to: {OUTPUT_FILE}")